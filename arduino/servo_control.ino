@@ -5,7 +5,7 @@ Stepper stepper(stepsPerRev, 8, 10, 9, 11);
 
 void setup() {
   stepper.setSpeed(15);
-  Serial.begin(9600);
+  Serial.begin(115200);
 }
 
 void loop() {
@@ -1,32 +1,70 @@
-import os
 import io
 import re
-import json
-import base64
-import tempfile
+import time
+import queue
+import logging
+import logging.handlers
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
+import av
+import httpx
 import numpy as np
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from google import genai
 
 import stt
 import tts
 import llm
 import config
-from gemini import GeminiRequest, GEMINI_CONFIG
+from gemini import GeminiRequest, GEMINI_CONFIG, GEMINI_MODEL
+
+
+logger = logging.getLogger("sai")
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Queue log records so stream writes happen on a listener thread, not the event loop."""
+    log_queue = queue.Queue(-1)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(config.LOG_LEVEL)
+    logger.propagate = False
+    return logging.handlers.QueueListener(log_queue, handler)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    log_listener = setup_logging()
+    log_listener.start()
     if config.GEMINI_API_KEY and config.LLM_PROVIDER == "gemini":
         app.state.gemini_client = genai.Client(api_key=config.GEMINI_API_KEY)
     else:
         app.state.gemini_client = None
+    app.state.elevenlabs_client = tts.create_client()
+    # Whisper gets its own threads so model calls never queue behind other executor work
+    app.state.stt_executor = ThreadPoolExecutor(max_workers=stt.CONCURRENCY, thread_name_prefix="stt")
+    app.state.stt_semaphore = asyncio.Semaphore(stt.CONCURRENCY)
+
+    # Pay model load and connection setup before the first user arrives
+    try:
+        await asyncio.get_running_loop().run_in_executor(app.state.stt_executor, stt.warmup)
+    except Exception as e:
+        logger.warning("[STARTUP] Whisper warmup failed: %s: %s", type(e).__name__, e)
+    try:
+        await tts.warmup(app.state.elevenlabs_client)
+    except Exception as e:
+        logger.warning("[STARTUP] ElevenLabs warmup failed: %s: %s", type(e).__name__, e)
     yield
     app.state.gemini_client = None
+    await app.state.elevenlabs_client.aclose()
+    app.state.stt_executor.shutdown()
+    log_listener.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -39,29 +77,214 @@ app.add_middleware(
 )
 
 SAMPLE_RATE = 16000
-CHANNELS = 1
-
-EMOTION_PATTERN = re.compile(r'^\[?(happy|sad|angry|surprised|concerned|neutral)\]?\s*', re.IGNORECASE)
-
-
-def extract_amplitude_envelope(mp3_bytes: bytes, bucket_ms: int = 50) -> list[float]:
-    """Extract normalized amplitude envelope from MP3 bytes."""
-    from pydub import AudioSegment
-    audio_seg = AudioSegment.from_mp3(io.BytesIO(mp3_bytes))
-    samples = np.array(audio_seg.get_array_of_samples(), dtype=np.float32)
-    if audio_seg.channels == 2:
-        samples = samples[::2]
-    bucket_size = int(audio_seg.frame_rate * bucket_ms / 1000)
-    amplitudes = []
-    for i in range(0, len(samples), bucket_size):
-        chunk = samples[i:i + bucket_size]
-        rms = float(np.sqrt(np.mean(chunk ** 2)))
-        amplitudes.append(rms)
-    if amplitudes:
-        max_amp = max(amplitudes)
+
+EMOTIONS = {"happy", "sad", "angry", "surprised", "concerned", "neutral"}
+EMOTION_PATTERN = re.compile(r'^\[(happy|sad|angry|surprised|concerned|neutral)\b\]?\s*', re.IGNORECASE)
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+# 50 ms RMS of loud speech in float samples; streamed envelopes are scaled so this is 1.0
+SPEECH_PEAK_RMS = 0.3
+
+
+def decode_pcm(audio_bytes: bytes) -> np.ndarray:
+    """Decode compressed audio to mono 16 kHz float32 samples in [-1, 1]."""
+    # Resample straight to packed float32 so no separate int16 -> float pass is needed
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+    chunks = []
+    with av.open(io.BytesIO(audio_bytes)) as container:
+        for frame in container.decode(audio=0):
+            chunks.extend(out.to_ndarray().ravel() for out in resampler.resample(frame))
+    chunks.extend(out.to_ndarray().ravel() for out in resampler.resample(None))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks)
+
+
+def _bucket_rms(samples: np.ndarray, bucket_size: int, normalize: bool = True) -> list[float]:
+    """RMS of each bucket_size slice of float32 samples, squaring them in place.
+
+    A short tail is kept as its own final bucket.
+    """
+    n = (len(samples) // bucket_size) * bucket_size
+    blocks = samples[:n].reshape(-1, bucket_size)
+    np.square(blocks, out=blocks)
+    rms = blocks.mean(axis=1)
+    if n < len(samples):
+        tail = samples[n:]
+        rms = np.append(rms, np.mean(np.square(tail)))
+    np.sqrt(rms, out=rms)
+    if normalize and len(rms):
+        max_amp = rms.max()
         if max_amp > 0:
-            amplitudes = [a / max_amp for a in amplitudes]
-    return amplitudes
+            rms /= max_amp
+    return rms.tolist()
+
+
+class AmplitudeEnvelope:
+    """Rolling amplitude envelope over an MP3 stream that arrives in chunks.
+
+    Chunks are decoded once, incrementally, and each call to feed() returns only
+    the buckets completed since the previous call. Buckets are scaled against a
+    fixed speech level rather than the loudest one seen so far, so a quiet
+    lead-in stays quiet however small the first chunks are.
+    """
+
+    def __init__(self, bucket_ms: int = 50):
+        self.bucket_ms = bucket_ms
+        self._codec = av.CodecContext.create("mp3", "r")
+        self._bucket_size = None
+        self._pending = []
+
+    def feed(self, chunk: bytes) -> list[float]:
+        for packet in self._codec.parse(chunk):
+            self._decode(packet)
+        return self._collect(final=False)
+
+    def flush(self) -> list[float]:
+        for packet in self._codec.parse(None):
+            self._decode(packet)
+        self._decode(None)
+        return self._collect(final=True)
+
+    def _decode(self, packet):
+        try:
+            frames = self._codec.decode(packet)
+        except av.error.InvalidDataError:
+            return
+        for frame in frames:
+            if self._bucket_size is None:
+                self._bucket_size = int(frame.sample_rate * self.bucket_ms / 1000)
+            # Planar frames come back as (channels, samples); average to mono
+            samples = frame.to_ndarray().mean(axis=0, dtype=np.float32)
+            if frame.format.name.startswith("s16"):
+                samples /= 32768
+            self._pending.append(samples)
+
+    def _collect(self, final: bool) -> list[float]:
+        if not self._pending:
+            return []
+        samples = np.concatenate(self._pending)
+        # Samples short of a full bucket wait for the next chunk until the stream ends
+        n = len(samples) if final else (len(samples) // self._bucket_size) * self._bucket_size
+        self._pending = [samples[n:]] if n < len(samples) else []
+        if n == 0:
+            return []
+        amplitudes = _bucket_rms(samples[:n], self._bucket_size, normalize=False)
+        return [min(a / SPEECH_PEAK_RMS, 1.0) for a in amplitudes]
+
+
+def parse_emotion(text: str) -> tuple[str, str]:
+    """Split the leading emotion tag off an LLM response, returning (emotion, text)."""
+    if text.startswith("["):
+        end = text.find("]")
+        tag = text[1:end].lower()
+        if end > 0 and tag in EMOTIONS:
+            return tag, text[end + 1:].lstrip()
+    else:
+        head, _, rest = text.partition(" ")
+        if head.lower() in EMOTIONS:
+            return head.lower(), rest.lstrip()
+    # Slow path for malformed tags such as a missing closing bracket
+    emotion_match = EMOTION_PATTERN.match(text)
+    if emotion_match:
+        return emotion_match.group(1).lower(), text[emotion_match.end():]
+    return 'neutral', text
+
+
+async def send_message(websocket: WebSocket, msg: dict):
+    """Send a control message as a JSON text frame; binary frames are reserved for audio."""
+    await websocket.send_text(orjson.dumps(msg).decode())
+
+
+async def send_batch(websocket: WebSocket, msgs: list[dict]):
+    """Send adjacent control messages in a single websocket frame."""
+    if len(msgs) == 1:
+        await send_message(websocket, msgs[0])
+    else:
+        await send_message(websocket, {"type": "batch", "msgs": msgs})
+
+
+async def stream_response(websocket: WebSocket, user_text: str, voice_id: str = None, cache: bool = True):
+    """Run the LLM, TTS and send stages of a turn as a concurrent pipeline.
+
+    Each sentence is handed to TTS as soon as the LLM finishes it, and audio is
+    forwarded to the client while later sentences are still being generated.
+    With cache set, repeated prompts and sentences are served from memory.
+    """
+    loop = asyncio.get_running_loop()
+    sentences: asyncio.Queue = asyncio.Queue()
+    chunks: asyncio.Queue = asyncio.Queue()
+    emotion = 'neutral'
+    t0 = time.time()
+
+    async def generate():
+        nonlocal emotion
+        first = True
+
+        def emit(sentence: str):
+            nonlocal emotion, first
+            # Parse emotion tag from the opening sentence only
+            if first:
+                first = False
+                emotion, sentence = parse_emotion(sentence)
+            if sentence.strip():
+                logger.debug("[LLM] (%.2fs) Sentence: '%s'", time.time() - t0, sentence)
+                sentences.put_nowait(sentence)
+
+        pending = ""
+        async for token in llm.generate_stream(user_text, websocket.app.state.gemini_client, cache=cache):
+            pending += token
+            *complete, pending = SENTENCE_BOUNDARY.split(pending)
+            for sentence in complete:
+                emit(sentence)
+        emit(pending)
+        await sentences.put(None)
+
+    async def synthesize():
+        while (sentence := await sentences.get()) is not None:
+            async for chunk in tts.synthesize(
+                sentence, websocket.app.state.elevenlabs_client, voice_id=voice_id, cache=cache
+            ):
+                await chunks.put(chunk)
+        await chunks.put(None)
+
+    async def send():
+        envelope = AmplitudeEnvelope(bucket_ms=50)
+        seq = 0
+        total = 0
+        while (chunk := await chunks.get()) is not None:
+            msgs = []
+            if seq == 0:
+                logger.info("[TTS] (%.2fs) First audio chunk", time.time() - t0)
+                msgs.append({
+                    "type": "audio_start",
+                    "emotion": emotion,
+                    "amplitudeBucketMs": 50,
+                })
+            amplitudes = await loop.run_in_executor(None, envelope.feed, chunk)
+            # JSON header frame, then the raw MP3 bytes in a binary frame
+            msgs.append({
+                "type": "audio_chunk",
+                "seq": seq,
+                "amplitudes": amplitudes,
+                "len": len(chunk),
+            })
+            await send_batch(websocket, msgs)
+            await websocket.send_bytes(chunk)
+            seq += 1
+            total += len(chunk)
+        if seq == 0:
+            await send_message(websocket, {"type": "error", "message": "empty response"})
+            return
+        amplitudes = await loop.run_in_executor(None, envelope.flush)
+        await send_message(websocket, {"type": "audio_end", "amplitudes": amplitudes})
+        logger.info("[TTS] (%.2fs) Streamed %d bytes in %d chunks", time.time() - t0, total, seq)
+
+    tasks = [asyncio.create_task(stage) for stage in (generate(), synthesize(), send())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 @app.get("/health")
@@ -73,7 +296,7 @@ def health():
 async def generate_text(req: GeminiRequest):
     try:
         response = app.state.gemini_client.models.generate_content(
-            model="gemini-3-flash-preview",
+            model=GEMINI_MODEL,
             contents=req.prompt,
             config=GEMINI_CONFIG
         )
@@ -82,10 +305,28 @@ async def generate_text(req: GeminiRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/tts")
+async def text_to_speech(req: tts.TTSRequest):
+    audio = tts.synthesize(req.text, app.state.elevenlabs_client, voice_id=req.voice_id)
+    # Wait for the first chunk so ElevenLabs errors become an error status rather
+    # than a 200 with an empty body
+    try:
+        first = await anext(audio, b"")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def stream():
+        yield first
+        async for chunk in audio:
+            yield chunk
+
+    return StreamingResponse(stream(), media_type="audio/mpeg")
+
+
 @app.websocket("/ws/conversation")
 async def conversation_ws(websocket: WebSocket):
     await websocket.accept()
-    print("[WS] Connection accepted", flush=True)
+    logger.info("[WS] Connection accepted")
 
     loop = asyncio.get_event_loop()
 
@@ -93,108 +334,70 @@ async def conversation_ws(websocket: WebSocket):
         try:
             raw = await websocket.receive_text()
             try:
-                data = json.loads(raw)
+                data = orjson.loads(raw)
             except Exception:
                 continue
             msg_type = data.get("type")
 
             if msg_type == "ping":
-                await websocket.send_json({"type": "pong"})
+                await send_message(websocket, {"type": "pong"})
                 continue
 
-            print(f"[WS] Received: {msg_type}")
+            logger.debug("[WS] Received: %s", msg_type)
 
             if msg_type == "audio_data":
-                # Audio captured by the browser and sent as base64
-                audio_b64 = data.get("audio")
-                if not audio_b64:
-                    await websocket.send_json({"type": "error", "message": "no audio data"})
+                # Audio captured by the browser follows this header as a binary frame
+                audio_bytes = await websocket.receive_bytes()
+                if not audio_bytes:
+                    await send_message(websocket, {"type": "error", "message": "no audio data"})
                     continue
 
-                await websocket.send_json({"type": "processing"})
+                await send_message(websocket, {"type": "processing"})
 
-                audio_bytes = base64.b64decode(audio_b64)
                 audio_format = data.get("format", "webm")
                 voice_id = data.get("voiceId")
-                print(f"[AUDIO] Received {len(audio_bytes)} bytes ({audio_format}) from browser, voice={voice_id}")
-
-                # Convert browser audio to WAV using pydub (requires ffmpeg)
-                from pydub import AudioSegment
-                audio_seg = AudioSegment.from_file(io.BytesIO(audio_bytes), format=audio_format)
-                audio_seg = audio_seg.set_channels(CHANNELS).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
-
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-                    audio_seg.export(tmp.name, format="wav")
-                    tmp_path = tmp.name
-
-                duration = len(audio_seg) / 1000.0
-                print(f"[AUDIO] Converted to WAV: {duration:.2f}s")
-
-                try:
-                    import time as _time
-
-                    # Transcribe
-                    t0 = _time.time()
-                    user_text = await loop.run_in_executor(None, stt.transcribe, tmp_path)
-                    print(f"[STT] ({_time.time()-t0:.2f}s) Result: '{user_text}'")
-                    await websocket.send_json({"type": "transcript", "text": user_text})
-
-                    if not user_text.strip():
-                        print("[STT] Empty transcription, skipping TTS")
-                        await websocket.send_json({"type": "error", "message": "could not understand audio"})
-                        continue
-
-                    # Get response from LLM
-                    t0 = _time.time()
-                    response_text = await loop.run_in_executor(
-                        None,
-                        lambda: llm.generate(user_text, websocket.app.state.gemini_client)
-                    )
-                    print(f"[LLM] ({_time.time()-t0:.2f}s) Response: '{response_text}'")
-
-                    # Parse emotion tag
-                    emotion = 'neutral'
-                    emotion_match = EMOTION_PATTERN.match(response_text)
-                    if emotion_match:
-                        emotion = emotion_match.group(1)
-                        response_text = response_text[emotion_match.end():]
-
-                    # Synthesize speech
-                    t0 = _time.time()
-                    audio = await loop.run_in_executor(
-                        None, lambda: tts.synthesize(response_text, voice_id=voice_id)
+                cache = data.get("cache", True)
+                logger.info(
+                    "[AUDIO] Received %d bytes (%s) from browser, voice=%s", len(audio_bytes), audio_format, voice_id
+                )
+
+                # Decode browser audio to 16 kHz mono PCM in-process
+                samples = await loop.run_in_executor(None, decode_pcm, audio_bytes)
+
+                duration = len(samples) / SAMPLE_RATE
+                logger.debug("[AUDIO] Decoded to PCM: %.2fs", duration)
+
+                # Transcribe
+                t0 = time.time()
+                async with websocket.app.state.stt_semaphore:
+                    user_text = await loop.run_in_executor(
+                        websocket.app.state.stt_executor, stt.transcribe, samples
                     )
-                    print(f"[TTS] ({_time.time()-t0:.2f}s) Got {len(audio)} bytes")
+                logger.info("[STT] (%.2fs) Result: '%s'", time.time() - t0, user_text)
+                transcript = {"type": "transcript", "text": user_text}
+
+                if not user_text.strip():
+                    logger.info("[STT] Empty transcription, skipping TTS")
+                    await send_batch(websocket, [
+                        transcript,
+                        {"type": "error", "message": "could not understand audio"},
+                    ])
+                    continue
+                await send_batch(websocket, [transcript])
 
-                    # Extract amplitude envelope for lip sync
-                    t0 = _time.time()
-                    amplitudes = await loop.run_in_executor(
-                        None, extract_amplitude_envelope, audio
-                    )
-                    print(f"[LIPSYNC] ({_time.time()-t0:.2f}s) {len(amplitudes)} buckets")
-
-                    audio_b64 = base64.b64encode(audio).decode()
-                    await websocket.send_json({
-                        "type": "audio",
-                        "audio": audio_b64,
-                        "emotion": emotion,
-                        "amplitudes": amplitudes,
-                        "amplitudeBucketMs": 50,
-                    })
-                    print("[WS] Sent audio response to client")
-                finally:
-                    os.unlink(tmp_path)
+                # Overlap LLM generation, speech synthesis and sending
+                t0 = time.time()
+                await stream_response(websocket, user_text, voice_id, cache)
+                logger.info("[WS] (%.2fs) Sent audio response to client", time.time() - t0)
 
         except WebSocketDisconnect:
-            print("[WS] Client disconnected")
+            logger.info("[WS] Client disconnected")
             break
         except Exception as e:
-            print(f"[ERROR] {type(e).__name__}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[ERROR] %s: %s", type(e).__name__, e)
             try:
-                await websocket.send_json({"type": "error", "message": str(e)})
+                await send_message(websocket, {"type": "error", "message": str(e)})
             except Exception:
                 break
 
-    print("[WS] Connection closed")
+    logger.info("[WS] Connection closed")
@@ -0,0 +1,21 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded in-memory cache that evicts the least recently used entry."""
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
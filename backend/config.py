@@ -6,9 +6,13 @@ load_dotenv(Path(__file__).parent / ".env")
 
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID", "s3TPKV1kjDlVtZbl4Ksh")
+# MP3 only: the lip sync envelope and browser playback both expect MPEG audio
+ELEVENLABS_OUTPUT_FORMAT = os.getenv("ELEVENLABS_OUTPUT_FORMAT", "mp3_22050_32")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # LLM provider: "ollama" for local, "gemini" for cloud
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ollama")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -25,6 +25,8 @@ EMOTION TAGS:
 - Example: [concerned] That sounds painful, you should see a doctor soon.
 """
 
+GEMINI_MODEL = "gemini-3-flash-preview"
+
 THINKING_CONFIG = types.ThinkingConfig(thinking_level=types.ThinkingLevel.LOW)
 
 GEMINI_CONFIG = types.GenerateContentConfig(
@@ -1,41 +1,67 @@
+from typing import AsyncIterator
+
 import ollama
 import config
-from gemini import SYSTEM_INSTRUCTIONS, GEMINI_CONFIG
+from cache import LRUCache
+from gemini import SYSTEM_INSTRUCTIONS, GEMINI_CONFIG, GEMINI_MODEL
 
 _ollama_client = None
 
+# Completed responses keyed by (model, normalized user text)
+_cache = LRUCache(maxsize=512)
+
 
 def _get_ollama_client():
     global _ollama_client
     if _ollama_client is None:
-        _ollama_client = ollama.Client(host=config.OLLAMA_URL)
+        _ollama_client = ollama.AsyncClient(host=config.OLLAMA_URL)
     return _ollama_client
 
 
-def generate(user_text: str, gemini_client=None) -> str:
-    """Generate a response using the configured LLM provider."""
-    if config.LLM_PROVIDER == "ollama":
-        return _ollama_generate(user_text)
-    else:
-        return _gemini_generate(user_text, gemini_client)
-
-
-def _ollama_generate(user_text: str) -> str:
+async def _ollama_stream(user_text: str, gemini_client=None) -> AsyncIterator[str]:
     client = _get_ollama_client()
-    response = client.chat(
+    stream = await client.chat(
         model=config.OLLAMA_MODEL,
         messages=[
             {"role": "system", "content": SYSTEM_INSTRUCTIONS},
             {"role": "user", "content": user_text},
         ],
+        stream=True,
     )
-    return response["message"]["content"]
+    async for chunk in stream:
+        yield chunk["message"]["content"]
 
 
-def _gemini_generate(user_text: str, client) -> str:
-    response = client.models.generate_content(
-        model="gemini-3-flash-preview",
+async def _gemini_stream(user_text: str, gemini_client) -> AsyncIterator[str]:
+    stream = await gemini_client.aio.models.generate_content_stream(
+        model=GEMINI_MODEL,
         contents=user_text,
         config=GEMINI_CONFIG,
     )
-    return response.text
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+
+# The provider is fixed by config, so it is resolved once here instead of on every turn
+if config.LLM_PROVIDER == "ollama":
+    _stream, _model = _ollama_stream, config.OLLAMA_MODEL
+else:
+    _stream, _model = _gemini_stream, GEMINI_MODEL
+
+
+async def generate_stream(user_text: str, gemini_client=None, cache: bool = True) -> AsyncIterator[str]:
+    """Yield response text fragments from the configured LLM provider as they arrive."""
+    key = (_model, user_text.strip().lower())
+    if cache:
+        response = _cache.get(key)
+        if response is not None:
+            yield response
+            return
+
+    parts = []
+    async for fragment in _stream(user_text, gemini_client):
+        parts.append(fragment)
+        yield fragment
+    if cache:
+        _cache.put(key, "".join(parts))
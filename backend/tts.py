@@ -1,28 +1,75 @@
-from elevenlabs import ElevenLabs
+from typing import AsyncIterator
+
+import httpx
+from pydantic import BaseModel
+
 import config
+from cache import LRUCache
+
+ELEVENLABS_URL = "https://api.elevenlabs.io"
+# Chunk size used when replaying cached audio
+CHUNK_SIZE = 4096
+
+# Completed MP3 audio keyed by (voice_id, output_format, normalized text)
+_cache = LRUCache(maxsize=512)
+
+
+class TTSRequest(BaseModel):
+    text: str
+    voice_id: str | None = None
 
-_client = None
-
-
-def _get_client():
-    global _client
-    if _client is None:
-        _client = ElevenLabs(api_key=config.ELEVENLABS_API_KEY)
-    return _client
-
-
-def synthesize(text: str, voice_id: str = None) -> bytes:
-    client = _get_client()
-    audio = client.text_to_speech.convert(
-        voice_id=voice_id or config.ELEVENLABS_VOICE_ID,
-        text=text,
-        model_id="eleven_flash_v2_5",
-        output_format="mp3_22050_32",
-        voice_settings={
-            "stability": 0.5,
-            "similarity_boost": 0.75,
-            "style": 0.4,
-            "use_speaker_boost": True
-        }
+
+def create_client() -> httpx.AsyncClient:
+    """Pooled HTTP/2 client for ElevenLabs, shared by every request for keepalive."""
+    return httpx.AsyncClient(
+        base_url=ELEVENLABS_URL,
+        http2=True,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=60),
     )
-    return b"".join(audio)
+
+
+async def warmup(client: httpx.AsyncClient):
+    """Open a pooled connection to ElevenLabs so the first synthesis skips DNS and TLS setup."""
+    response = await client.get("/v1/voices", headers={"xi-api-key": config.ELEVENLABS_API_KEY})
+    response.raise_for_status()
+
+
+async def synthesize(text: str, client: httpx.AsyncClient, voice_id: str = None,
+                     output_format: str = None, cache: bool = True) -> AsyncIterator[bytes]:
+    """Stream MP3 audio for text from ElevenLabs as it is generated."""
+    voice_id = voice_id or config.ELEVENLABS_VOICE_ID
+    output_format = output_format or config.ELEVENLABS_OUTPUT_FORMAT
+    key = (voice_id, output_format, text.strip().lower())
+    if cache:
+        audio = _cache.get(key)
+        if audio is not None:
+            for i in range(0, len(audio), CHUNK_SIZE):
+                yield audio[i:i + CHUNK_SIZE]
+            return
+
+    parts = []
+    async with client.stream(
+        "POST",
+        f"/v1/text-to-speech/{voice_id}/stream",
+        params={"output_format": output_format},
+        headers={"xi-api-key": config.ELEVENLABS_API_KEY},
+        json={
+            "text": text,
+            "model_id": "eleven_flash_v2_5",
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.75,
+                "style": 0.4,
+                "use_speaker_boost": True
+            },
+        },
+    ) as response:
+        response.raise_for_status()
+        # Forward each network read as it lands; re-chunking to a fixed size would
+        # hold back the first ~second of audio at this bitrate
+        async for chunk in response.aiter_bytes():
+            parts.append(chunk)
+            yield chunk
+    if cache:
+        _cache.put(key, b"".join(parts))
@@ -68,66 +68,171 @@ function connect() {
 
     ws.onerror = () => {};
 
+    ws.binaryType = 'arraybuffer';
+
     ws.onmessage = (event) => {
+        // Binary frames carry the MP3 bytes announced by the preceding audio_chunk header
+        if (event.data instanceof ArrayBuffer) {
+            appendAudio(new Uint8Array(event.data), pendingChunk?.amplitudes);
+            pendingChunk = null;
+            return;
+        }
+
         let data;
         try { data = JSON.parse(event.data); } catch { return; }
-
-        if (data.type === 'pong') {
-            // keepalive response
-        } else if (data.type === 'transcript') {
-            setStatus(`heard: "${data.text}"`);
-        } else if (data.type === 'audio') {
-            setStatus('speaking');
-            setSpeaking();
-            playAudio(data.audio, data.emotion || 'neutral', data.amplitudes, data.amplitudeBucketMs);
-        } else if (data.type === 'error') {
-            setStatus('error: ' + (data.message || ''));
-            notifySpeakingDone();
-        } else if (data.type === 'processing') {
-            setStatus('processing...');
-        }
+        handleMessage(data);
     };
 }
 
-function playAudio(base64Audio, emotion, amplitudes, bucketMs) {
-    const audioBytes = Uint8Array.from(atob(base64Audio), c => c.charCodeAt(0));
-    console.log(`[Audio] Received ${audioBytes.length} bytes, attempting playback`);
+// Header of the audio chunk whose binary frame is expected next
+let pendingChunk = null;
 
-    const blob = new Blob([audioBytes], { type: 'audio/mpeg' });
-    const url = URL.createObjectURL(blob);
+function handleMessage(data) {
+    if (data.type === 'batch') {
+        data.msgs.forEach(handleMessage);
+    } else if (data.type === 'pong') {
+        // keepalive response
+    } else if (data.type === 'transcript') {
+        setStatus(`heard: "${data.text}"`);
+    } else if (data.type === 'audio_start') {
+        setStatus('speaking');
+        setSpeaking();
+        startAudio(data.emotion || 'neutral', data.amplitudeBucketMs);
+    } else if (data.type === 'audio_chunk') {
+        pendingChunk = data;
+    } else if (data.type === 'audio_end') {
+        endAudio(data.amplitudes);
+    } else if (data.type === 'error') {
+        stopAudio();
+        setStatus('error: ' + (data.message || ''));
+        notifySpeakingDone();
+    } else if (data.type === 'processing') {
+        setStatus('processing...');
+    }
+}
 
-    // Reuse the pre-unlocked audio element
-    audioEl.src = url;
-    let playing = true;
-    const bucketDuration = (bucketMs || 50) / 1000;
+// Stream MP3 chunks straight into the audio element where MediaSource allows it,
+// otherwise collect them and play the whole clip once the stream ends.
+const canStreamAudio = !!window.MediaSource && MediaSource.isTypeSupported('audio/mpeg');
+
+// Playback state for the response currently being streamed
+let playback = null;
+
+function startAudio(emotion, bucketMs) {
+    if (playback?.url) URL.revokeObjectURL(playback.url);
+
+    const p = {
+        chunks: [],
+        amplitudes: [],
+        bucketDuration: (bucketMs || 50) / 1000,
+        ended: false,
+        playing: true,
+        url: null,
+        mediaSource: null,
+        sourceBuffer: null,
+    };
+    playback = p;
 
     setEmotion(emotion);
 
     audioEl.onended = () => {
         console.log('[Audio] Playback ended');
-        playing = false;
+        p.playing = false;
         stopLipSync();
         setEmotion('neutral');
         setStatus('listening for "hey sai"');
-        URL.revokeObjectURL(url);
+        URL.revokeObjectURL(p.url);
         notifySpeakingDone();
     };
 
     audioEl.onerror = (e) => {
         console.error('[Audio] Playback error:', e);
-        playing = false;
+        p.playing = false;
         setStatus('listening for "hey sai"');
-        URL.revokeObjectURL(url);
+        URL.revokeObjectURL(p.url);
         notifySpeakingDone();
     };
 
+    if (canStreamAudio) {
+        p.mediaSource = new MediaSource();
+        p.mediaSource.addEventListener('sourceopen', () => {
+            p.sourceBuffer = p.mediaSource.addSourceBuffer('audio/mpeg');
+            p.sourceBuffer.mode = 'sequence';
+            p.sourceBuffer.addEventListener('updateend', () => flushAudio(p));
+            flushAudio(p);
+        }, { once: true });
+        p.url = URL.createObjectURL(p.mediaSource);
+        audioEl.src = p.url;
+        beginPlayback(p);
+    }
+}
+
+function appendAudio(audioBytes, amplitudes) {
+    const p = playback;
+    if (!p) return;
+    p.chunks.push(audioBytes);
+    if (amplitudes) p.amplitudes.push(...amplitudes);
+    flushAudio(p);
+}
+
+function endAudio(amplitudes) {
+    const p = playback;
+    if (!p) return;
+    if (amplitudes) p.amplitudes.push(...amplitudes);
+    p.ended = true;
+
+    if (canStreamAudio) {
+        flushAudio(p);
+        return;
+    }
+
+    const blob = new Blob(p.chunks, { type: 'audio/mpeg' });
+    console.log(`[Audio] Received ${blob.size} bytes, attempting playback`);
+    p.chunks = [];
+    p.url = URL.createObjectURL(blob);
+    audioEl.src = p.url;
+    beginPlayback(p);
+}
+
+// Abandon a response cut short by a server error, so the mouth closes and the
+// partial clip doesn't keep playing over the next wake word
+function stopAudio() {
+    const p = playback;
+    if (!p) return;
+    playback = null;
+    p.playing = false;
+    p.chunks = [];
+    audioEl.onended = null;
+    audioEl.onerror = null;
+    if (p.mediaSource?.readyState === 'open' && !p.sourceBuffer?.updating) {
+        p.mediaSource.endOfStream();
+    }
+    audioEl.pause();
+    audioEl.removeAttribute('src');
+    audioEl.load();
+    stopLipSync();
+    setEmotion('neutral');
+    if (p.url) URL.revokeObjectURL(p.url);
+}
+
+function flushAudio(p) {
+    if (!p.sourceBuffer || p.sourceBuffer.updating) return;
+    if (p.chunks.length > 0) {
+        p.sourceBuffer.appendBuffer(p.chunks.shift());
+    } else if (p.ended && p.mediaSource.readyState === 'open') {
+        p.mediaSource.endOfStream();
+    }
+}
+
+function beginPlayback(p) {
     const update = () => {
-        if (!playing) return;
-        if (amplitudes && amplitudes.length > 0 && !audioEl.paused) {
-            const bucketIndex = Math.floor(audioEl.currentTime / bucketDuration);
+        if (!p.playing) return;
+        const amplitudes = p.amplitudes;
+        if (amplitudes.length > 0 && !audioEl.paused) {
+            const bucketIndex = Math.floor(audioEl.currentTime / p.bucketDuration);
             const clampedIndex = Math.min(bucketIndex, amplitudes.length - 1);
             const nextIndex = Math.min(clampedIndex + 1, amplitudes.length - 1);
-            const fraction = (audioEl.currentTime / bucketDuration) - bucketIndex;
+            const fraction = (audioEl.currentTime / p.bucketDuration) - bucketIndex;
             const interpolated = amplitudes[clampedIndex] * (1 - fraction)
                                + amplitudes[nextIndex] * fraction;
             updateLipSync(interpolated);
@@ -204,10 +309,12 @@ function startApp() {
             };
             setStatus(labels[newState] || newState);
         },
-        onCommandAudio: (base64, format) => {
+        onCommandAudio: (blob, format) => {
             if (ws && ws.readyState === WebSocket.OPEN) {
                 const voiceId = CHARACTERS[currentCharIndex].voiceId;
-                ws.send(JSON.stringify({ type: 'audio_data', audio: base64, format, voiceId }));
+                // Header frame, then the recording itself as a binary frame
+                ws.send(JSON.stringify({ type: 'audio_data', format, voiceId }));
+                ws.send(blob);
             }
         },
         onError: (message) => {
@@ -255,12 +255,7 @@ function finishRecording() {
     audioChunks = [];
     const format = mimeType.includes('mp4') ? 'mp4' : 'webm';
 
-    const reader = new FileReader();
-    reader.onloadend = () => {
-        const base64 = reader.result.split(',')[1];
-        _onCommandAudio?.(base64, format);
-    };
-    reader.readAsDataURL(blob);
+    _onCommandAudio?.(blob, format);
 }
 
 function cleanupMedia() {
@@ -5,79 +5,343 @@ Detects user movement via camera and sends commands to Arduino.
 """
 
 import cv2
+import numpy as np
 import serial
 import time
 import os
-import mediapipe as mp
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 SERIAL_PORT = os.getenv("SERIAL_PORT", "/dev/ttyACM0")
-CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", "0"))
+BAUD_RATE = 115200  # must match Serial.begin in arduino/servo_control.ino
+# Time the Arduino spends on one command: 20 steps at 15 RPM on a 2048-step motor
+COMMAND_DURATION = 20 / (2048 * 15 / 60)
+CAMERA_INDEX = os.getenv("CAMERA_INDEX", "0")  # or "auto" to use the first camera found
+# Only normalized nose coordinates are used, so a small frame loses nothing
+FRAME_WIDTH = 320
+FRAME_HEIGHT = 240
+CAMERA_FPS = 10
 MOVEMENT_THRESHOLD = 0.02
+# Serial command and log label for each movement direction (-1 left, +1 right)
+DIRECTIONS = {-1: (b'l', "LEFT"), 1: (b'r', "RIGHT")}
+MIN_KEYPOINT_SCORE = 0.3
+# Once locked on, the TFLite path crops a square of this fraction of the shorter
+# frame side around the last nose position, re-checking the full frame periodically
+ROI_SIZE = 0.75
+ROI_REANCHOR_FRAMES = 30
+# CPU threads for the XNNPACK TFLite path; one core is left to camera and serial I/O
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", str(max(1, (os.cpu_count() or 1) - 1))))
+# A camera that returns no frames for this long is treated as unplugged
+CAMERA_TIMEOUT = 1.0
+FPS_REPORT_INTERVAL = 100  # frames between FPS log lines
+# Frames whose 32x32 grayscale thumbnail differs from the last inferred one by
+# less than this sum of absolute differences (~2 levels per pixel) reuse its pose
+THUMB_SIZE = (32, 32)
+STILL_FRAME_SAD = 2 * THUMB_SIZE[0] * THUMB_SIZE[1]
 
-BaseOptions = mp.tasks.BaseOptions
-PoseLandmarker = mp.tasks.vision.PoseLandmarker
-PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
-VisionRunningMode = mp.tasks.vision.RunningMode
+# A .task bundle runs through MediaPipe; a .tflite file is treated as a
+# quantized single-pose keypoint model (MoveNet layout, uint8 input) run on XNNPACK,
+# or on a Coral Edge TPU when compiled by edgetpu_compiler (*_edgetpu.tflite)
+MODEL_PATH = os.getenv(
+    "POSE_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "pose_landmarker_lite.task"),
+)
 
-MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pose_landmarker_lite.task")
+
+class MediaPipePose:
+    """MediaPipe PoseLandmarker in VIDEO mode."""
+
+    def __init__(self, model_path):
+        # Imported here so the TFLite backends never pay mediapipe's slow import
+        import mediapipe as mp
+        self.mp = mp
+
+        options = mp.tasks.vision.PoseLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_path),
+            running_mode=mp.tasks.vision.RunningMode.VIDEO,
+            num_poses=1,
+            min_pose_detection_confidence=0.5,
+            min_pose_presence_confidence=0.5,
+            min_tracking_confidence=0.5,
+        )
+        self.landmarker = mp.tasks.vision.PoseLandmarker.create_from_options(options)
+        self.frame_ts = 0
+        self.rgb = None
+
+    def detect(self, frame):
+        """Return the normalized (x, y) of the nose in a BGR frame, or None if no pose is found."""
+        # Convert into a buffer reused across frames instead of allocating one per call
+        if self.rgb is None or self.rgb.shape != frame.shape:
+            self.rgb = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        mp_image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=self.rgb)
+        # VIDEO mode needs strictly increasing timestamps; use real time now that
+        # the frame rate is set by the camera rather than a fixed sleep
+        self.frame_ts = max(self.frame_ts + 1, int(time.monotonic() * 1000))
+        results = self.landmarker.detect_for_video(mp_image, self.frame_ts)
+        if not results.pose_landmarks:
+            return None
+        nose = results.pose_landmarks[0][0]
+        return nose.x, nose.y
+
+    def close(self):
+        self.landmarker.close()
+
+
+class TFLitePose:
+    """Quantized single-pose keypoint model through the TFLite interpreter.
+
+    Expects a uint8 [1, H, W, 3] RGB input and a [1, 1, 17, 3] output of
+    (y, x, score) keypoints with the nose first, as MoveNet produces. A
+    quantized output is dequantized; other input types are rejected.
+    """
+
+    def __init__(self, model_path):
+        if model_path.endswith("_edgetpu.tflite"):
+            from pycoral.utils.edgetpu import make_interpreter
+            self.interpreter = make_interpreter(model_path)
+        else:
+            from tflite_runtime.interpreter import Interpreter
+            self.interpreter = Interpreter(model_path=model_path, num_threads=INFERENCE_THREADS)
+        self.interpreter.allocate_tensors()
+        input_details = self.interpreter.get_input_details()[0]
+        if input_details["dtype"] != np.uint8:
+            raise ValueError(
+                f"{model_path} takes {np.dtype(input_details['dtype']).name} input; "
+                "only uint8-input pose models are supported"
+            )
+        self.input_index = input_details["index"]
+        _, self.height, self.width, _ = input_details["shape"]
+        output_details = self.interpreter.get_output_details()[0]
+        self.output_index = output_details["index"]
+        # (scale, zero_point); a scale of 0 means the output is already float
+        self.output_quantization = output_details["quantization"]
+        self.resized = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.roi_center = None
+        self.roi_frames = 0
+
+    def detect(self, frame):
+        """Return the normalized (x, y) of the nose in a BGR frame, or None if no pose is found."""
+        frame_h, frame_w = frame.shape[:2]
+        x0 = y0 = 0
+        image = frame
+        if self.roi_center is not None and self.roi_frames < ROI_REANCHOR_FRAMES:
+            # The nose can't jump far between frames, so only look around where it was
+            side = int(min(frame_h, frame_w) * ROI_SIZE)
+            cx, cy = self.roi_center
+            x0 = min(max(int(cx * frame_w) - side // 2, 0), frame_w - side)
+            y0 = min(max(int(cy * frame_h) - side // 2, 0), frame_h - side)
+            image = frame[y0:y0 + side, x0:x0 + side]
+            self.roi_frames += 1
+        else:
+            self.roi_frames = 0
+
+        nose = self._infer(image)
+        if nose is None:
+            self.roi_center = None
+            return None
+        image_h, image_w = image.shape[:2]
+        self.roi_center = ((x0 + nose[0] * image_w) / frame_w, (y0 + nose[1] * image_h) / frame_h)
+        return self.roi_center
+
+    def _infer(self, image):
+        # Shrink first so the channel swap only touches the model-sized image
+        cv2.resize(image, (self.width, self.height), dst=self.resized, interpolation=cv2.INTER_AREA)
+        # Write straight into the interpreter's own input tensor. The view must not
+        # outlive this statement or invoke() refuses to run
+        cv2.cvtColor(
+            self.resized, cv2.COLOR_BGR2RGB, dst=self.interpreter.tensor(self.input_index)()[0]
+        )
+        self.interpreter.invoke()
+        nose = self.interpreter.get_tensor(self.output_index)[0, 0, 0]
+        scale, zero_point = self.output_quantization
+        if scale:
+            nose = (nose.astype(np.float32) - zero_point) * scale
+        y, x, score = nose
+        if score < MIN_KEYPOINT_SCORE:
+            return None
+        return float(x), float(y)
+
+    def close(self):
+        pass
+
+
+def load_pose_model(model_path):
+    if model_path.endswith(".tflite"):
+        return TFLitePose(model_path)
+    return MediaPipePose(model_path)
+
+
+def _probe_camera(index):
+    cap = cv2.VideoCapture(index)
+    ok = cap.isOpened()
+    cap.release()
+    return ok
+
+
+def find_camera():
+    """Return the lowest camera index that opens, or None.
+
+    Failed opens can take seconds each on Linux, so indices are probed in
+    parallel, and the usual 0-2 before the rest.
+    """
+    with ThreadPoolExecutor(max_workers=7) as pool:
+        for indices in (range(0, 3), range(3, 10)):
+            for index, ok in zip(indices, pool.map(_probe_camera, indices)):
+                if ok:
+                    return index
+    return None
+
+
+def run_stage(target, stop, errors, *args):
+    """Run a pipeline stage, stopping the whole pipeline if it fails."""
+    try:
+        target(*args, stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+
+def read_frames(cap, frames, resize_to, stop):
+    """Reader stage: keep the frame queue topped up with the freshest camera frames."""
+    last_frame = time.monotonic()
+    while not stop.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            if time.monotonic() - last_frame > CAMERA_TIMEOUT:
+                raise RuntimeError("Camera stopped returning frames.")
+            time.sleep(0.05)
+            continue
+        last_frame = time.monotonic()
+        if resize_to is not None:
+            frame = cv2.resize(frame, resize_to, interpolation=cv2.INTER_AREA)
+        # Drop the oldest frame rather than block, so inference never runs on stale input
+        if frames.full():
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                pass
+        frames.put(frame)
+
+
+def write_commands(ser, commands, stop):
+    """Writer stage: forward movement commands to the Arduino."""
+    last_cmd = None
+    last_sent = 0.0
+    while not stop.is_set():
+        try:
+            cmd = commands.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        # A repeat that arrives while the motor is still executing the previous one
+        # would only queue up in the Arduino's buffer and make it lag behind
+        now = time.monotonic()
+        if cmd == last_cmd and now - last_sent < COMMAND_DURATION:
+            continue
+        ser.write(cmd)
+        last_cmd, last_sent = cmd, now
 
 
 def main():
+    # OpenCV only does small resizes and conversions here; keep its thread pool from
+    # competing with inference for the Pi's cores
+    cv2.setNumThreads(1)
+
     print(f"Connecting to Arduino on {SERIAL_PORT}...")
-    ser = serial.Serial(SERIAL_PORT, 9600, timeout=1)
+    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
     time.sleep(2)
     print("Arduino connected.")
 
-    print(f"Starting camera {CAMERA_INDEX}...")
-    options = PoseLandmarkerOptions(
-        base_options=BaseOptions(model_asset_path=MODEL_PATH),
-        running_mode=VisionRunningMode.VIDEO,
-        num_poses=1,
-        min_pose_detection_confidence=0.5,
-        min_pose_presence_confidence=0.5,
-        min_tracking_confidence=0.5,
-    )
-    landmarker = PoseLandmarker.create_from_options(options)
-    cap = cv2.VideoCapture(CAMERA_INDEX)
-    print("Camera started. Tracking...\n")
+    camera_index = find_camera() if CAMERA_INDEX == "auto" else int(CAMERA_INDEX)
+    if camera_index is None:
+        ser.close()
+        raise SystemExit("No camera found.")
+    print(f"Starting camera {camera_index}...")
+    pose = load_pose_model(MODEL_PATH)
+    cap = cv2.VideoCapture(camera_index)
+    if not cap.isOpened():
+        pose.close()
+        ser.close()
+        raise SystemExit(f"Could not open camera {camera_index}.")
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+    # Pace the loop at the driver and keep a single buffered frame so reads are never stale
+    cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    # Fall back to downscaling in the reader if the driver ignores the requested size
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    resize_to = None if frame_size == (FRAME_WIDTH, FRAME_HEIGHT) else (FRAME_WIDTH, FRAME_HEIGHT)
+    print(f"Camera started at {frame_size[0]}x{frame_size[1]}. Tracking with {os.path.basename(MODEL_PATH)}...\n")
 
     smoothed_x = 0.5
     prev_x = None
-    frame_ts = 0
+    nose = None
+    last_thumb = None
+    frame_times = deque(maxlen=FPS_REPORT_INTERVAL)
+
+    # Camera decode, inference and serial writes run as three overlapping stages
+    frames = queue.Queue(maxsize=2)
+    commands = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    errors = []
+    stages = [
+        threading.Thread(target=run_stage, args=(read_frames, stop, errors, cap, frames, resize_to), daemon=True),
+        threading.Thread(target=run_stage, args=(write_commands, stop, errors, ser, commands), daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
 
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
+        while not stop.is_set():
+            try:
+                frame = frames.get(timeout=0.5)
+            except queue.Empty:
                 continue
 
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
-            frame_ts += 33
-            results = landmarker.detect_for_video(mp_image, frame_ts)
+            frame_times.append(time.monotonic())
+            if len(frame_times) == FPS_REPORT_INTERVAL:
+                print(f"[FPS] {(len(frame_times) - 1) / (frame_times[-1] - frame_times[0]):.1f}")
+                frame_times.clear()
+
+            # Skip inference when the scene has not changed since the last detection
+            thumb = cv2.cvtColor(
+                cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY
+            )
+            if last_thumb is None or cv2.norm(thumb, last_thumb, cv2.NORM_L1) >= STILL_FRAME_SAD:
+                nose = pose.detect(frame)
+                last_thumb = thumb
 
-            if results.pose_landmarks:
-                nose = results.pose_landmarks[0][0]
-                smoothed_x = 0.7 * smoothed_x + 0.3 * nose.x
+            if nose is not None:
+                smoothed_x = 0.7 * smoothed_x + 0.3 * nose[0]
 
                 if prev_x is not None:
                     delta = smoothed_x - prev_x
-                    if delta > MOVEMENT_THRESHOLD:
-                        ser.write(b'r')
-                        print("-> RIGHT")
-                    elif delta < -MOVEMENT_THRESHOLD:
-                        ser.write(b'l')
-                        print("-> LEFT")
+                    direction = (delta > MOVEMENT_THRESHOLD) - (delta < -MOVEMENT_THRESHOLD)
+                    if direction:
+                        cmd, label = DIRECTIONS[direction]
+                        # Drop the command if the writer is behind; a fresh one follows next frame
+                        try:
+                            commands.put_nowait(cmd)
+                        except queue.Full:
+                            pass
+                        print(f"-> {label}")
 
                 prev_x = smoothed_x
 
-            time.sleep(0.1)
+        # A stage died (camera or Arduino unplugged); surface its error instead of hanging
+        if errors:
+            raise errors[0]
 
     except KeyboardInterrupt:
         print("\nStopping...")
     finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
         cap.release()
-        landmarker.close()
+        pose.close()
         ser.close()
         print("Done.")
 